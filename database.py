@@ -1,11 +1,18 @@
 import asyncio
+import heapq
+import math
 import sqlite3
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 from astrbot.api import logger
 from astrbot.core.utils.plugin_kv_store import PluginKVStoreMixin
 
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
 BLACKLIST_KV_KEY = "blacklist_entries"
 BLACKLIST_HISTORY_KV_KEY = "blacklist_history"
 BlacklistEntry = dict[str, str | None]
@@ -21,13 +28,46 @@ class BlacklistDatabase:
     ):
         self.plugin = plugin
         self.auto_delete_expired_after = auto_delete_expired_after
+        # 配置在运行期间不会变化，预先算好清理开关和间隔
+        self._auto_delete_enabled = auto_delete_expired_after != -1
+        self._sweep_interval = max(60, auto_delete_expired_after // 10)
         self.legacy_db_paths = [Path(path) for path in (legacy_db_paths or [])]
         self._blacklist: dict[str, BlacklistEntry] = {}
         self._history: dict[str, list[BlacklistHistoryEntry]] = {}
+        # 预解析的过期时间戳缓存，永久封禁记为 math.inf，消息入口只查此表
+        self._expire_at: dict[str, float] = {}
+        # 限时封禁的 (过期时间戳, 用户ID) 小顶堆，仅在开启自动删除时维护，清理任务只需查看堆顶；
+        # 移除或重新封禁留下的旧条目在出堆时与 _expire_at 比对后丢弃
+        self._expire_heap: list[tuple[float, str]] = []
+        # 堆顶变为更早的过期时间时唤醒清理任务重新计算休眠时长
+        self._sweep_wakeup = asyncio.Event()
+        # 仅用于串行化写入；读取方法内部没有 await，无需加锁
         self._lock = asyncio.Lock()
+        self._sweep_task: asyncio.Task | None = None
+        # 同一事件循环轮次内的并发 add_user 调用会合并为一次写入
+        self._pending_adds: list[
+            tuple[tuple[str, str, str | None, str], asyncio.Future]
+        ] = []
+        self._flush_task: asyncio.Task | None = None
+        # 已调度但尚未完成写入的合并任务，terminate 时需全部等待
+        self._inflight_flushes: set[asyncio.Task] = set()
+        # 按封禁时间倒序排好的列表快照，黑名单变更时失效
+        self._sorted_users_cache: list[tuple[str, str, str | None, str]] | None = None
+        # 黑名单版本号，每次变更递增，供上层缓存判断是否失效
+        self.version = 0
+        # 批量写入上下文的嵌套深度，按进入上下文的任务记录：只有该任务自身的写入
+        # 会被推迟，其他调用方及其创建的子任务照常立即写入
+        self._batch_depths: dict[asyncio.Task, int] = {}
+        self._blacklist_dirty = False
+        self._history_dirty = False
 
     async def initialize(self):
         """初始化 KV 存储，并在需要时迁移旧版 SQLite 数据。"""
+        await self._load()
+        if self._auto_delete_enabled:
+            self._sweep_task = asyncio.create_task(self._expire_sweep_loop())
+
+    async def _load(self) -> None:
         stored_entries = await self.plugin.get_kv_data(BLACKLIST_KV_KEY, None)
         stored_history = await self.plugin.get_kv_data(BLACKLIST_HISTORY_KV_KEY, None)
 
@@ -38,6 +78,7 @@ class BlacklistDatabase:
             self._history = self._normalize_history(
                 stored_history if isinstance(stored_history, dict) else {}
             )
+            self._rebuild_expire_cache()
             if not self._history and self._blacklist:
                 self._history = self._build_history_from_blacklist(self._blacklist)
                 await self._save_history()
@@ -59,125 +100,282 @@ class BlacklistDatabase:
         await self._save_history()
 
     async def terminate(self):
-        """KV 存储无需显式关闭。"""
+        """写入尚未落盘的封禁并停止过期清理任务，KV 存储无需显式关闭。"""
+        if self._inflight_flushes:
+            await asyncio.gather(*self._inflight_flushes, return_exceptions=True)
+        if self._sweep_task is None:
+            return
+        self._sweep_task.cancel()
+        try:
+            await self._sweep_task
+        except asyncio.CancelledError:
+            pass
+        self._sweep_task = None
+
+    def _in_batch(self) -> bool:
+        return self._batch_depths.get(asyncio.current_task(), 0) > 0
+
+    async def __aenter__(self) -> "Self":
+        """进入批量写入上下文，当前任务的变更在退出最外层上下文时一次性写入 KV。"""
+        task = asyncio.current_task()
+        self._batch_depths[task] = self._batch_depths.get(task, 0) + 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        task = asyncio.current_task()
+        depth = self._batch_depths[task] - 1
+        if depth > 0:
+            self._batch_depths[task] = depth
+            return
+        del self._batch_depths[task]
+        async with self._lock:
+            if self._blacklist_dirty:
+                await self._save_blacklist()
+            if self._history_dirty:
+                await self._save_history()
+
+    @property
+    def has_entries(self) -> bool:
+        """黑名单是否非空，消息入口可据此在无需检查时直接返回。"""
+        return bool(self._expire_at)
 
     async def is_user_blacklisted(self, user_id: str) -> bool:
-        """检查用户是否在黑名单中，如果过期则按配置处理。"""
+        """检查用户是否在黑名单中，过期记录由后台任务统一清理。"""
         user_id = str(user_id)
-        async with self._lock:
-            user = self._blacklist.get(user_id)
-            if not user:
-                return False
+        expire_at = self._expire_at.get(user_id)
+        if expire_at is None:
+            return False
 
-            expire_time = user.get("expire_time")
-            if not expire_time:
+        now = time.time()
+        if now <= expire_at:
+            if expire_at == math.inf:
                 logger.info(f"用户 {user_id} 在永久黑名单中，消息已被阻止")
-                return True
-
-            try:
-                expire_datetime = datetime.fromisoformat(expire_time)
-            except ValueError:
-                logger.warning(f"用户 {user_id} 的过期时间格式异常，已视为未过期")
-                return True
-
-            now = datetime.now()
-            if now <= expire_datetime:
+            else:
                 logger.info(f"用户 {user_id} 在黑名单中，消息已被阻止")
-                return True
+            return True
+        return False
 
-            if self.auto_delete_expired_after != -1:
-                delete_time = expire_datetime + timedelta(
-                    seconds=self.auto_delete_expired_after
+    async def _expire_sweep_loop(self) -> None:
+        # 启动后先清理一次，处理插件停用期间已达到删除时间的记录
+        while True:
+            try:
+                await self._sweep_expired()
+                await self._wait_for_next_sweep()
+            except Exception as e:  # noqa: BLE001
+                # 有意兜底：单次清理或等待失败只记录日志，不能让后台任务退出
+                logger.error(f"清理过期黑名单时出错：{e}")
+
+    async def _wait_for_next_sweep(self) -> None:
+        """休眠到最早的删除时间（至少间隔 _sweep_interval），没有限时封禁时一直等待。"""
+        while True:
+            self._sweep_wakeup.clear()
+            timeout = None
+            if self._expire_heap:
+                delay = (
+                    self._expire_heap[0][0]
+                    + self.auto_delete_expired_after
+                    - time.time()
                 )
-                if now > delete_time:
-                    self._blacklist.pop(user_id, None)
-                    await self._save_blacklist()
-            return False
+                timeout = max(delay, self._sweep_interval)
+            try:
+                await asyncio.wait_for(self._sweep_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def _sweep_expired(self) -> int:
+        """一次性移除所有超出自动删除延迟的过期记录，只写入一次 KV。"""
+        async with self._lock:
+            cutoff = time.time() - self.auto_delete_expired_after
+            removed = 0
+            while self._expire_heap and self._expire_heap[0][0] < cutoff:
+                expire_at, user_id = heapq.heappop(self._expire_heap)
+                if self._expire_at.get(user_id) != expire_at:
+                    continue
+                self._blacklist.pop(user_id, None)
+                self._expire_at.pop(user_id, None)
+                removed += 1
+            if not removed:
+                return 0
+            await self._save_blacklist()
+        logger.info(f"已自动清理 {removed} 条过期黑名单记录。")
+        return removed
 
     async def get_blacklist_count(self) -> int:
         """获取黑名单中的用户数量。"""
-        async with self._lock:
-            return len(self._blacklist)
+        return len(self._blacklist)
 
     async def get_blacklist_users(self, page: int = 1, page_size: int = 10):
         """获取黑名单用户列表（支持分页）。"""
-        async with self._lock:
-            offset = max(page - 1, 0) * page_size
-            users = self._sorted_users()
-            return users[offset : offset + page_size]
+        offset = max(page - 1, 0) * page_size
+        users = self._sorted_users()
+        return users[offset : offset + page_size]
 
     async def get_user_info(self, user_id: str):
         """获取特定用户的黑名单信息。"""
         user_id = str(user_id)
-        async with self._lock:
-            user = self._blacklist.get(user_id)
-            if not user:
-                return None
-            return (
-                user_id,
-                user.get("ban_time") or "",
-                user.get("expire_time"),
-                user.get("reason") or "",
-            )
+        user = self._blacklist.get(user_id)
+        if not user:
+            return None
+        return (
+            user_id,
+            user.get("ban_time") or "",
+            user.get("expire_time"),
+            user.get("reason") or "",
+        )
 
     async def add_user(
         self, user_id: str, ban_time: str, expire_time: str = None, reason: str = ""
     ):
-        """添加用户到黑名单。"""
-        user_id = str(user_id)
+        """添加用户到黑名单，并发调用会合并到同一次 KV 写入。"""
+        if self._in_batch():
+            # 批量上下文内的写入本就推迟到退出时，无需合并，也避免把其他调用方带入推迟
+            return await self.add_users([(user_id, ban_time, expire_time, reason)])
+        future = asyncio.get_running_loop().create_future()
+        self._pending_adds.append(((user_id, ban_time, expire_time, reason), future))
+        if self._flush_task is None:
+            task = asyncio.create_task(self._flush_pending_adds())
+            self._flush_task = task
+            self._inflight_flushes.add(task)
+            task.add_done_callback(self._on_flush_done)
+        return await future
+
+    async def _flush_pending_adds(self) -> None:
+        # 让出一个事件循环轮次，收集同一时刻到达的其他封禁请求
+        await asyncio.sleep(0)
+        pending, self._pending_adds = self._pending_adds, []
+        self._flush_task = None
+        try:
+            result = await self.add_users([user for user, _ in pending])
+        except BaseException as e:
+            # 异常逐一转交给各调用方，而不是在这里吞掉
+            for _, future in pending:
+                if future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            if not isinstance(e, Exception):
+                raise
+            return
+        for _, future in pending:
+            if not future.done():
+                future.set_result(result)
+
+    def _on_flush_done(self, task: asyncio.Task) -> None:
+        self._inflight_flushes.discard(task)
+        if self._flush_task is not task:
+            return
+        # 任务在收集请求前就被取消，接管队列并取消等待中的调用，避免永久挂起
+        self._flush_task = None
+        pending, self._pending_adds = self._pending_adds, []
+        for _, future in pending:
+            future.cancel()
+
+    async def add_users(self, users: list[tuple[str, str, str | None, str]]):
+        """批量添加用户到黑名单，整批只写入一次 KV。"""
         async with self._lock:
-            self._blacklist[user_id] = {
-                "ban_time": str(ban_time),
-                "expire_time": str(expire_time) if expire_time else None,
-                "reason": str(reason or ""),
-            }
-            self._history.setdefault(user_id, []).append(
-                {
+            for user_id, ban_time, expire_time, reason in users:
+                user_id = str(user_id)
+                entry: BlacklistEntry = {
                     "ban_time": str(ban_time),
                     "expire_time": str(expire_time) if expire_time else None,
                     "reason": str(reason or ""),
                 }
-            )
+                self._blacklist[user_id] = entry
+                expire_at = self._parse_expire_at(user_id, expire_time)
+                self._expire_at[user_id] = expire_at
+                if self._auto_delete_enabled and expire_at != math.inf:
+                    heapq.heappush(self._expire_heap, (expire_at, user_id))
+                    if self._expire_heap[0] == (expire_at, user_id):
+                        self._sweep_wakeup.set()
+                self._history.setdefault(user_id, []).append(dict(entry))
             await self._save_blacklist()
             await self._save_history()
             return True
 
-    async def remove_user(self, user_id: str):
-        """从黑名单中移除用户。"""
-        user_id = str(user_id)
+    async def remove_user(self, user_id: str) -> bool:
+        """从黑名单中移除用户，返回用户此前是否在黑名单中。"""
+        return await self.remove_users([user_id]) > 0
+
+    async def remove_users(self, user_ids: list[str]) -> int:
+        """批量从黑名单中移除用户，整批只写入一次 KV，返回实际移除的数量。"""
         async with self._lock:
-            self._blacklist.pop(user_id, None)
-            await self._save_blacklist()
-            return True
+            removed = 0
+            for user_id in user_ids:
+                user_id = str(user_id)
+                if self._blacklist.pop(user_id, None) is not None:
+                    removed += 1
+                self._expire_at.pop(user_id, None)
+            if removed:
+                await self._save_blacklist()
+            return removed
 
-    async def clear_blacklist(self):
-        """清空黑名单。"""
+    async def clear_blacklist(self) -> int:
+        """清空黑名单，返回被移除的用户数量。"""
         async with self._lock:
+            count = len(self._blacklist)
+            if not count:
+                return 0
             self._blacklist.clear()
+            self._expire_at.clear()
+            self._expire_heap.clear()
             await self._save_blacklist()
-            return True
+            return count
+
+    def _parse_expire_at(self, user_id: str, expire_time: str | None) -> float:
+        if not expire_time:
+            return math.inf
+        try:
+            return datetime.fromisoformat(expire_time).timestamp()
+        except ValueError:
+            logger.warning(f"用户 {user_id} 的过期时间格式异常，已视为未过期")
+            return math.inf
+
+    def _rebuild_expire_cache(self) -> None:
+        self._expire_at = {
+            user_id: self._parse_expire_at(user_id, entry.get("expire_time"))
+            for user_id, entry in self._blacklist.items()
+        }
+        if not self._auto_delete_enabled:
+            return
+        self._expire_heap = [
+            (expire_at, user_id)
+            for user_id, expire_at in self._expire_at.items()
+            if expire_at != math.inf
+        ]
+        heapq.heapify(self._expire_heap)
 
     async def _save_blacklist(self) -> None:
+        # 所有黑名单变更都会经过这里保存，顺带使分页快照失效
+        self._sorted_users_cache = None
+        self.version += 1
+        if self._in_batch():
+            self._blacklist_dirty = True
+            return
+        self._blacklist_dirty = False
         await self.plugin.put_kv_data(BLACKLIST_KV_KEY, self._blacklist)
 
     async def _save_history(self) -> None:
+        if self._in_batch():
+            self._history_dirty = True
+            return
+        self._history_dirty = False
         await self.plugin.put_kv_data(BLACKLIST_HISTORY_KV_KEY, self._history)
 
     async def get_user_history_count(self, user_id: str) -> int:
         user_id = str(user_id)
-        async with self._lock:
-            return len(self._history.get(user_id, []))
+        return len(self._history.get(user_id, []))
 
     async def get_user_history(
         self, user_id: str, limit: int = 5
     ) -> tuple[list[tuple[str, str | None, str]], int]:
         user_id = str(user_id)
         limit = max(1, limit)
-        async with self._lock:
-            history = self._sorted_history(self._history.get(user_id, []))
-            shown = history[:limit]
-            remaining = max(len(history) - limit, 0)
-            return shown, remaining
+        history = self._sorted_history(self._history.get(user_id, []))
+        shown = history[:limit]
+        remaining = max(len(history) - limit, 0)
+        return shown, remaining
 
     def _normalize_blacklist(self, entries: dict) -> dict[str, BlacklistEntry]:
         normalized: dict[str, BlacklistEntry] = {}
@@ -222,6 +420,8 @@ class BlacklistDatabase:
         return normalized
 
     def _sorted_users(self) -> list[tuple[str, str, str | None, str]]:
+        if self._sorted_users_cache is not None:
+            return self._sorted_users_cache
         users = [
             (
                 user_id,
@@ -232,6 +432,7 @@ class BlacklistDatabase:
             for user_id, entry in self._blacklist.items()
         ]
         users.sort(key=lambda item: item[1], reverse=True)
+        self._sorted_users_cache = users
         return users
 
     def _sorted_history(
@@ -289,6 +490,7 @@ class BlacklistDatabase:
 
         self._blacklist = self._normalize_blacklist(merged_entries)
         self._history = self._build_history_from_blacklist(self._blacklist)
+        self._rebuild_expire_cache()
         await self._save_blacklist()
         await self._save_history()
 
@@ -1,5 +1,9 @@
+from collections import OrderedDict
+import hashlib
 from html import escape
+import json
 import sys
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import AsyncGenerator
@@ -16,6 +20,13 @@ from .utils.text_to_image import text_to_image
 from .database import BlacklistDatabase
 
 LEGACY_DATA_DIR_NAMES = ("astrbot_plugin_blacklist_toolss",)
+RENDER_CACHE_SIZE = 8
+# 图片地址的有效期由 t2i 服务决定，缓存只保留较短时间
+RENDER_CACHE_TTL = 300
+# 回退文本图使用的分隔线，集中定义便于统一调整宽度
+LIST_FALLBACK_RULE = "=" * 64
+LIST_FALLBACK_SEPARATOR = "-" * 64
+INFO_FALLBACK_RULE = "=" * 48
 BLACKLIST_IMAGE_OPTIONS = {
     "type": "png",
     "full_page": True,
@@ -299,6 +310,10 @@ class MyPlugin(Star):
             self.auto_delete_expired_after,
             legacy_db_paths=self._get_legacy_db_paths(),
         )
+        # ls/info 渲染结果缓存：模板与内容摘要 -> (图片地址, 写入时间)，
+        # 超过 RENDER_CACHE_TTL 或黑名单变更后失效
+        self._render_cache: OrderedDict[bytes, tuple[str, float]] = OrderedDict()
+        self._render_cache_version = self.db.version
 
     def _get_legacy_db_paths(self) -> list[Path]:
         data_dir = StarTools.get_data_dir()
@@ -324,38 +339,53 @@ class MyPlugin(Star):
             parsed = default
         return max(1, min(parsed, max_limit))
 
-    async def _resolve_user_display_name(
-        self, event: AstrMessageEvent, user_id: str
-    ) -> str:
-        user_id = str(user_id)
-        if user_id == str(event.get_sender_id()):
-            sender_name = event.get_sender_name().strip()
-            if sender_name:
-                return sender_name
-
+    async def _get_group_nicknames(self, event: AstrMessageEvent) -> dict[str, str]:
+        """一次性获取当前群成员昵称表，供同一页的多条记录复用。"""
         if not event.get_group_id():
-            return ""
+            return {}
 
         try:
             group = await event.get_group()
         except Exception as e:
-            logger.debug(f"获取群成员信息失败，无法解析昵称 {user_id}: {e}")
-            return ""
+            logger.debug(f"获取群成员信息失败，无法解析昵称: {e}")
+            return {}
 
         if not group or not group.members:
-            return ""
+            return {}
 
+        nicknames: dict[str, str] = {}
         for member in group.members:
-            if str(member.user_id) != user_id:
-                continue
             nickname = (member.nickname or "").strip()
             if nickname:
-                return nickname
-        return ""
+                nicknames.setdefault(str(member.user_id), nickname)
+        return nicknames
 
-    async def _format_user_label(self, event: AstrMessageEvent, user_id: str) -> str:
+    async def _resolve_user_display_name(
+        self,
+        event: AstrMessageEvent,
+        user_id: str,
+        group_nicknames: dict[str, str] | None = None,
+    ) -> str:
         user_id = str(user_id)
-        display_name = await self._resolve_user_display_name(event, user_id)
+        if user_id == str(event.get_sender_id()):
+            sender_name = event.get_sender_name().strip()
+            if sender_name:
+                return sender_name
+
+        if group_nicknames is None:
+            group_nicknames = await self._get_group_nicknames(event)
+        return group_nicknames.get(user_id, "")
+
+    async def _format_user_label(
+        self,
+        event: AstrMessageEvent,
+        user_id: str,
+        group_nicknames: dict[str, str] | None = None,
+    ) -> str:
+        user_id = str(user_id)
+        display_name = await self._resolve_user_display_name(
+            event, user_id, group_nicknames
+        )
         if display_name and display_name != user_id:
             return f"{display_name}({user_id})"
         return user_id
@@ -367,7 +397,19 @@ class MyPlugin(Star):
             normalized = default
         return escape(normalized)
 
-    def _build_blacklist_badge(self, expire_time: str | None) -> dict[str, str]:
+    @staticmethod
+    def _parse_datetime(value: str | None) -> datetime | str | None:
+        """预先解析 ISO 时间，解析失败时原样返回，交由各格式化函数给出提示。"""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+
+    def _build_blacklist_badge(
+        self, expire_time: datetime | str | None, now: datetime | None = None
+    ) -> dict[str, str]:
         if not expire_time:
             return {
                 "badge_text": "永久封禁",
@@ -376,7 +418,11 @@ class MyPlugin(Star):
             }
 
         try:
-            expire_dt = datetime.fromisoformat(expire_time)
+            expire_dt = (
+                expire_time
+                if isinstance(expire_time, datetime)
+                else datetime.fromisoformat(expire_time)
+            )
         except Exception:
             return {
                 "badge_text": "状态异常",
@@ -384,7 +430,7 @@ class MyPlugin(Star):
                 "badge_fg": "#475569",
             }
 
-        if datetime.now() >= expire_dt:
+        if (now or datetime.now()) >= expire_dt:
             return {
                 "badge_text": "已过期",
                 "badge_bg": "linear-gradient(135deg, #e2e8f0 0%, #f8fafc 100%)",
@@ -406,29 +452,36 @@ class MyPlugin(Star):
         await self.db.terminate()
 
     def _format_datetime(
-        self, iso_datetime_str, show_remaining=False, check_expire=False
+        self, iso_datetime_str, show_remaining=False, check_expire=False, now=None
     ):
         """统一格式化日期时间字符串
         Args:
-            iso_datetime_str: ISO格式的日期时间字符串
+            iso_datetime_str: ISO格式的日期时间字符串，或已解析的 datetime
             show_remaining: 是否显示剩余时间
             check_expire: 是否检查是否过期（仅对过期时间有效）
+            now: 当前时间，批量格式化时由调用方传入以复用
         """
         if not iso_datetime_str:
             return "永久"
         try:
-            datetime_obj = datetime.fromisoformat(iso_datetime_str)
+            datetime_obj = (
+                iso_datetime_str
+                if isinstance(iso_datetime_str, datetime)
+                else datetime.fromisoformat(iso_datetime_str)
+            )
             formatted_time = datetime_obj.strftime("%Y-%m-%d %H:%M:%S")
+            if now is None:
+                now = datetime.now()
 
             if check_expire:
-                if datetime.now() > datetime_obj:
+                if now > datetime_obj:
                     return "已过期"
 
             if show_remaining:
-                if datetime.now() > datetime_obj:
+                if now > datetime_obj:
                     return "已过期"
                 else:
-                    remaining_time = datetime_obj - datetime.now()
+                    remaining_time = datetime_obj - now
                     days = remaining_time.days
                     hours, remainder = divmod(remaining_time.seconds, 3600)
                     minutes, _ = divmod(remainder, 60)
@@ -460,19 +513,26 @@ class MyPlugin(Star):
         user: tuple[str, str, str | None, str | None],
         index: int,
         show_remaining: bool = False,
+        now: datetime | None = None,
+        group_nicknames: dict[str, str] | None = None,
     ) -> dict[str, str | int]:
         user_id, ban_time, expire_time, reason = user
-        user_label = await self._format_user_label(event, user_id)
-        badge = self._build_blacklist_badge(expire_time)
+        user_label = await self._format_user_label(event, user_id, group_nicknames)
+        if now is None:
+            now = datetime.now()
+        # 过期时间同时用于徽章和展示文本，只解析一次
+        expire_time = self._parse_datetime(expire_time)
+        badge = self._build_blacklist_badge(expire_time, now)
         return {
             "index": index,
             "user_label": user_label or user_id,
             "user_id": str(user_id),
-            "ban_time": self._format_datetime(ban_time, check_expire=False),
+            "ban_time": self._format_datetime(ban_time, check_expire=False, now=now),
             "expire_time": self._format_datetime(
                 expire_time,
                 show_remaining=show_remaining,
                 check_expire=True,
+                now=now,
             ),
             "reason": reason or "未填写理由",
             **badge,
@@ -510,7 +570,7 @@ class MyPlugin(Star):
     ) -> str:
         lines = [
             "黑名单档案",
-            "=" * 64,
+            LIST_FALLBACK_RULE,
             f"页码: {page}/{total_pages}",
             f"总数: {total_count}",
             f"每页: {page_size}",
@@ -526,7 +586,7 @@ class MyPlugin(Star):
                     f"过期时间: {entry['expire_time']}",
                     "封禁理由:",
                     str(entry["reason"]),
-                    "-" * 64,
+                    LIST_FALLBACK_SEPARATOR,
                 ]
             )
 
@@ -537,7 +597,7 @@ class MyPlugin(Star):
         return "\n".join(
             [
                 "黑名单详情",
-                "=" * 48,
+                INFO_FALLBACK_RULE,
                 f"用户: {entry['user_label']}",
                 f"UID: {entry['user_id']}",
                 f"状态: {entry['badge_text']}",
@@ -548,6 +608,47 @@ class MyPlugin(Star):
             ]
         )
 
+    @staticmethod
+    def _build_render_cache_key(template: str, template_data: dict) -> bytes:
+        payload = json.dumps(template_data, ensure_ascii=False, sort_keys=True)
+        digest = hashlib.blake2b(template.encode("utf-8"), digest_size=16)
+        digest.update(payload.encode("utf-8"))
+        return digest.digest()
+
+    def _get_cached_render(self, cache_key: bytes) -> str | None:
+        if self._render_cache_version != self.db.version:
+            self._render_cache.clear()
+            self._render_cache_version = self.db.version
+            return None
+        cached = self._render_cache.get(cache_key)
+        if cached is None:
+            return None
+        url, cached_at = cached
+        if time.monotonic() - cached_at > RENDER_CACHE_TTL:
+            del self._render_cache[cache_key]
+            return None
+        self._render_cache.move_to_end(cache_key)
+        return url
+
+    def _put_cached_render(self, cache_key: bytes, url: str) -> None:
+        self._render_cache[cache_key] = (url, time.monotonic())
+        self._render_cache.move_to_end(cache_key)
+        while len(self._render_cache) > RENDER_CACHE_SIZE:
+            self._render_cache.popitem(last=False)
+
+    async def _render_html_image(self, template: str, template_data: dict) -> str:
+        """渲染 HTML 模板为图片地址，模板内容未变化时直接复用上次的结果。"""
+        cache_key = self._build_render_cache_key(template, template_data)
+        url = self._get_cached_render(cache_key)
+        if url:
+            return url
+        url = await self.html_render(
+            template, template_data, options=BLACKLIST_IMAGE_OPTIONS
+        )
+        if url:
+            self._put_cached_render(cache_key, url)
+        return url
+
     async def _render_blacklist_list_result(
         self,
         event: AstrMessageEvent,
@@ -559,21 +660,18 @@ class MyPlugin(Star):
     ) -> MessageEventResult:
         pagination_hint = self._build_pagination_hint(page, total_pages, page_size)
         html_entries = [self._escape_blacklist_entry(entry) for entry in entries]
+        template_data = {
+            "entries": html_entries,
+            "total_count": total_count,
+            "page": page,
+            "total_pages": total_pages,
+            "page_size": page_size,
+            "pagination_hint": self._sanitize_template_text(
+                pagination_hint, "当前只有一页"
+            ),
+        }
         try:
-            url = await self.html_render(
-                BLACKLIST_LIST_TEMPLATE,
-                {
-                    "entries": html_entries,
-                    "total_count": total_count,
-                    "page": page,
-                    "total_pages": total_pages,
-                    "page_size": page_size,
-                    "pagination_hint": self._sanitize_template_text(
-                        pagination_hint, "当前只有一页"
-                    ),
-                },
-                options=BLACKLIST_IMAGE_OPTIONS,
-            )
+            url = await self._render_html_image(BLACKLIST_LIST_TEMPLATE, template_data)
             if url:
                 return event.image_result(url)
         except Exception as e:
@@ -592,11 +690,7 @@ class MyPlugin(Star):
     ) -> MessageEventResult:
         html_entry = self._escape_blacklist_entry(entry)
         try:
-            url = await self.html_render(
-                BLACKLIST_INFO_TEMPLATE,
-                html_entry,
-                options=BLACKLIST_IMAGE_OPTIONS,
-            )
+            url = await self._render_html_image(BLACKLIST_INFO_TEMPLATE, html_entry)
             if url:
                 return event.image_result(url)
         except Exception as e:
@@ -610,18 +704,26 @@ class MyPlugin(Star):
 
     @filter.event_message_type(filter.EventMessageType.ALL, priority=sys.maxsize - 1)
     async def on_all_message(self, event: AstrMessageEvent):
-        sender_id = event.get_sender_id()
-        try:
-            if event.is_admin() and not self.allow_blacklist_admin:
-                return
-
-            if await self.db.is_user_blacklisted(sender_id):
-                event.stop_event()
-                if self._should_notify_blacklisted_user():
-                    await event.send(MessageChain().message(self.blacklist_message))
+        if not self.db.has_entries:
+            return
+        if not self.allow_blacklist_admin and event.is_admin():
+            return
 
+        try:
+            blacklisted = await self.db.is_user_blacklisted(event.get_sender_id())
         except Exception as e:
             logger.error(f"检查黑名单时出错：{e}")
+            return
+        if not blacklisted:
+            return
+
+        event.stop_event()
+        if self._should_notify_blacklisted_user():
+            try:
+                await event.send(MessageChain().message(self.blacklist_message))
+            except Exception as e:  # noqa: BLE001
+                # 有意兜底：事件已被拦截，提示发送失败只记录日志，不影响拦截结果
+                logger.error(f"发送黑名单提示消息时出错：{e}")
 
     @filter.command_group("blacklist", alias=["black", "bl"])
     def blacklist():
@@ -651,8 +753,13 @@ class MyPlugin(Star):
 
             users = await self.db.get_blacklist_users(page, page_size)
             item_offset = (page - 1) * page_size
+            now = datetime.now()
+            # 整页共用一次群成员查询，避免每条记录都请求一次群信息
+            group_nicknames = await self._get_group_nicknames(event)
             entries = [
-                await self._build_blacklist_entry(event, user, index)
+                await self._build_blacklist_entry(
+                    event, user, index, now=now, group_nicknames=group_nicknames
+                )
                 for index, user in enumerate(users, start=item_offset + 1)
             ]
             yield await self._render_blacklist_list_result(
@@ -673,16 +780,11 @@ class MyPlugin(Star):
         """从黑名单中移除用户"""
         try:
             user_label = await self._format_user_label(event, user_id)
-            user = await self.db.get_user_info(user_id)
-
-            if not user:
-                yield event.plain_result(f"用户 {user_label} 不在黑名单中。")
-                return
 
             if await self.db.remove_user(user_id):
                 yield event.plain_result(f"用户 {user_label} 已从黑名单中移除。")
             else:
-                yield event.plain_result("从黑名单移除用户时出错。")
+                yield event.plain_result(f"用户 {user_label} 不在黑名单中。")
         except Exception as e:
             logger.error(f"从黑名单移除用户 {user_id} 时出错：{e}")
             yield event.plain_result("从黑名单移除用户时出错。")
@@ -695,11 +797,12 @@ class MyPlugin(Star):
         """添加用户到黑名单"""
         try:
             user_label = await self._format_user_label(event, user_id)
-            ban_time = datetime.now().isoformat()
+            now = datetime.now()
+            ban_time = now.isoformat()
             expire_time = None
 
             if duration > 0:
-                expire_time = (datetime.now() + timedelta(seconds=duration)).isoformat()
+                expire_time = (now + timedelta(seconds=duration)).isoformat()
 
             if await self.db.add_user(user_id, ban_time, expire_time, reason):
                 if duration > 0:
@@ -720,16 +823,13 @@ class MyPlugin(Star):
     async def clear(self, event: AstrMessageEvent):
         """清空黑名单"""
         try:
-            count = await self.db.get_blacklist_count()
+            count = await self.db.clear_blacklist()
 
             if count == 0:
                 yield event.plain_result("黑名单已经为空。")
                 return
 
-            if await self.db.clear_blacklist():
-                yield event.plain_result(f"黑名单已清空，共移除 {count} 个用户。")
-            else:
-                yield event.plain_result("清空黑名单时出错。")
+            yield event.plain_result(f"黑名单已清空，共移除 {count} 个用户。")
         except Exception as e:
             logger.error(f"清空黑名单时出错：{e}")
             yield event.plain_result("清空黑名单时出错。")
@@ -785,7 +885,8 @@ class MyPlugin(Star):
                 )
             # -----------------------------------------
 
-            ban_time = datetime.now().isoformat()
+            now = datetime.now()
+            ban_time = now.isoformat()
             expire_time = None
             actual_duration = duration_sec
             history_count = await self.db.get_user_history_count(user_id)
@@ -808,9 +909,7 @@ class MyPlugin(Star):
                 actual_duration = self.max_blacklist_duration
 
             if actual_duration > 0:
-                expire_time = (
-                    datetime.now() + timedelta(seconds=actual_duration)
-                ).isoformat()
+                expire_time = (now + timedelta(seconds=actual_duration)).isoformat()
 
             if not await self.db.add_user(user_id, ban_time, expire_time, reason):
                 yield event.plain_result("添加用户到黑名单时出错。")
@@ -2,17 +2,25 @@ import asyncio
 import base64
 import io
 import os
+from collections import OrderedDict
 from typing import Dict, Optional, Tuple
 
 from astrbot.api import logger
 from PIL import Image, ImageDraw, ImageFont
 
+# 仅在 HTML 渲染失败时走文本图回退，缓存少量结果即可
+IMAGE_CACHE_SIZE = 8
+DEFAULT_FONT_SIZE = 24
+
 
 class TextToImageConverter:
     def __init__(self):
         self._font_cache: Dict[int, ImageFont.FreeTypeFont] = {}
         self._default_font_path = self._get_default_font_path()
-        self._default_font = None
+        # 模块导入时预加载常用字号，首次渲染无需再读取字体文件
+        self._default_font = self._load_font(DEFAULT_FONT_SIZE)
+        # 渲染结果缓存：渲染参数元组 -> base64 图片，只在事件循环线程中读写
+        self._image_cache: OrderedDict[tuple, str] = OrderedDict()
 
     def _get_default_font_path(self) -> str:
         plugin_dir = os.path.dirname(os.path.abspath(__file__))
@@ -42,7 +50,7 @@ class TextToImageConverter:
         self,
         text: str,
         enable_markdown: bool = False,
-        font_size: int = 24,
+        font_size: int = DEFAULT_FONT_SIZE,
         font_color: Tuple[int, int, int] = (255, 255, 255),
         bg_color: Tuple[int, int, int] = (0, 0, 0),
         width: Optional[int] = None,
@@ -112,6 +120,9 @@ class TextToImageConverter:
             save_kwargs = {"format": image_format}
             if image_format.upper() == "JPEG":
                 save_kwargs["quality"] = quality
+            elif image_format.upper() == "PNG":
+                # 图片仅作为消息内嵌发送，低压缩级别编码更快，体积略大可接受
+                save_kwargs["compress_level"] = 1
 
             img.save(buffer, **save_kwargs)
             img_data = buffer.getvalue()
@@ -172,15 +183,19 @@ class TextToImageConverter:
         if font.getlength(line) <= max_width:
             return [line]
 
+        # 逐字累加宽度，避免每追加一个字符就重新测量整段前缀
         wrapped: list[str] = []
         current = ""
+        current_width = 0.0
         for char in line:
-            candidate = f"{current}{char}"
-            if current and font.getlength(candidate) > max_width:
+            char_width = font.getlength(char)
+            if current and current_width + char_width > max_width:
                 wrapped.append(current.rstrip())
                 current = char.lstrip()
+                current_width = char_width if current else 0.0
                 continue
-            current = candidate
+            current += char
+            current_width += char_width
 
         if current:
             wrapped.append(current.rstrip())
@@ -191,7 +206,7 @@ class TextToImageConverter:
         self,
         text: str,
         enable_markdown: bool = False,
-        font_size: int = 24,
+        font_size: int = DEFAULT_FONT_SIZE,
         font_color: Tuple[int, int, int] = (255, 255, 255),
         bg_color: Tuple[int, int, int] = (0, 0, 0),
         width: Optional[int] = None,
@@ -202,8 +217,7 @@ class TextToImageConverter:
         image_format: str = "PNG",
         quality: int = 95,
     ) -> Optional[str]:
-        return await asyncio.to_thread(
-            self.text_to_image,
+        params = (
             text,
             enable_markdown,
             font_size,
@@ -217,6 +231,17 @@ class TextToImageConverter:
             image_format,
             quality,
         )
+        cached = self._image_cache.get(params)
+        if cached is not None:
+            self._image_cache.move_to_end(params)
+            return cached
+
+        base64_data = await asyncio.to_thread(self.text_to_image, *params)
+        if base64_data:
+            self._image_cache[params] = base64_data
+            while len(self._image_cache) > IMAGE_CACHE_SIZE:
+                self._image_cache.popitem(last=False)
+        return base64_data
 
 
 _converter = TextToImageConverter()
@@ -225,7 +250,7 @@ _converter = TextToImageConverter()
 async def text_to_image(
     text: str,
     enable_markdown: bool = False,
-    font_size: int = 24,
+    font_size: int = DEFAULT_FONT_SIZE,
     font_color: Tuple[int, int, int] = (255, 255, 255),
     bg_color: Tuple[int, int, int] = (0, 0, 0),
     width: Optional[int] = None,